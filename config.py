@@ -1,25 +1,25 @@
 # File: config.py
-import os
-import json
+from typing import Optional
+from pydantic import PrivateAttr
 from pydantic_settings import BaseSettings
-from dotenv import load_dotenv
 from schemas import InvoiceData
 
-load_dotenv()
-
 # --- Application Settings ---
 
 class Settings(BaseSettings):
     # API Config
-    VLLM_API_URL: str = os.getenv("VLLM_API_URL", "http://localhost:8000/v1")
-    MODEL_NAME: str = os.getenv("MODEL_NAME", "Qwen/Qwen3-VL-4B-Instruct")
+    VLLM_API_URL: str = "http://localhost:8000/v1"
+    MODEL_NAME: str = "Qwen/Qwen3-VL-4B-Instruct"
     
     # Database Config
-    POSTGRES_USER: str = os.getenv("POSTGRES_USER", "postgres")
-    POSTGRES_PASSWORD: str = os.getenv("POSTGRES_PASSWORD", "password")
-    POSTGRES_SERVER: str = os.getenv("POSTGRES_SERVER", "localhost")
-    POSTGRES_PORT: str = os.getenv("POSTGRES_PORT", "5432")
-    POSTGRES_DB: str = os.getenv("POSTGRES_DB", "invoice_db")
+    POSTGRES_USER: str = "postgres"
+    POSTGRES_PASSWORD: str = "password"
+    POSTGRES_SERVER: str = "localhost"
+    POSTGRES_PORT: str = "5432"
+    POSTGRES_DB: str = "invoice_db"
+
+    # Cached system prompt (the schema is static for the process lifetime)
+    _system_prompt: Optional[str] = PrivateAttr(default=None)
     
     @property
     def DATABASE_URL(self) -> str:
@@ -28,11 +28,15 @@ class Settings(BaseSettings):
     def get_system_prompt(self) -> str:
         """
         Dynamically generates the system prompt using the Pydantic model's JSON schema.
+        The prompt is built once and cached on the settings instance.
         """
+        if self._system_prompt is not None:
+            return self._system_prompt
+
         # We now import InvoiceData from schemas.py
-        schema_json = json.dumps(InvoiceData.model_json_schema(), indent=2)
+        schema_json = InvoiceData.cached_json_schema()
         
-        return f"""Analyze the provided invoice image and extract all relevant information.
+        self._system_prompt = f"""Analyze the provided invoice image and extract all relevant information.
 
 Structure your output only as a valid JSON object that strictly adheres to the following schema.
 If a specific field or value is not present in the image, use null as the value for that field (do not omit the key).
@@ -41,6 +45,7 @@ Do not include any text, explanations, or markdown formatting.
 JSON Schema:
 {schema_json}
 """
+        return self._system_prompt
 
     class Config:
         env_file = ".env"
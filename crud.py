@@ -1,10 +1,11 @@
 # File: crud.py
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-from sqlalchemy.sql import func
+from sqlalchemy import LargeBinary, insert
+from sqlalchemy.orm import undefer
+from sqlalchemy.sql import func, lambda_stmt
 from models import InvoiceLog
-from schemas import InvoiceData
-from typing import List, Optional
+from typing import List, Optional, Dict, Any, Tuple, AsyncIterator
 
 # --- Log Operations ---
 
@@ -12,38 +13,60 @@ async def create_invoice_log(
     db: AsyncSession, 
     filename: str, 
     file_bytes: bytes, 
-    data: InvoiceData
-) -> InvoiceLog:
+    data: Dict[str, Any]
+) -> int:
     """
     Stores the log, file blob, and schema content in the Postgres Log table.
+    Expects the extracted data already dumped to a JSON-compatible dict.
+    Returns the id of the new log.
     """
-    db_log = InvoiceLog(
-        filename=filename,
-        file_content=file_bytes,
-        extracted_schema_content=data.model_dump(mode='json')
+    # Core INSERT ... RETURNING skips ORM identity-map bookkeeping for this append-only write
+    stmt = (
+        insert(InvoiceLog)
+        .values(
+            filename=filename,
+            file_content=file_bytes,
+            file_size=len(file_bytes),
+            extracted_schema_content=data
+        )
+        .returning(InvoiceLog.id)
     )
-    db.add(db_log)
+    result = await db.execute(stmt)
+    new_id = result.scalar_one()
     await db.commit()
-    await db.refresh(db_log)
-    return db_log
+    return new_id
 
 async def get_invoice_logs_metadata(
     db: AsyncSession, 
     skip: int = 0, 
     limit: int = 10, 
     search_query: str = None, 
-    search_type: str = "filename"
+    search_type: str = "filename",
+    include_schema: bool = False
 ):
     """
     Fetches log metadata and file size with optional filtering and pagination.
+    Unless include_schema is set, only the total amount due is projected out of
+    the extracted JSONB instead of the full document.
     """
-    stmt = (
-        select(
+    if include_schema:
+        schema_column = InvoiceLog.extracted_schema_content
+    else:
+        schema_column = (
+            InvoiceLog.extracted_schema_content["summary"]["total_amount_due"]
+            .astext
+            .label("total_amount_due")
+        )
+
+    # Lambda statements cache the compiled SQL; plain values in the closures
+    # (ids, search pattern, skip/limit) are extracted as bound parameters.
+    stmt = lambda_stmt(
+        lambda: select(
             InvoiceLog.id,
             InvoiceLog.filename,
             InvoiceLog.created_at,
-            InvoiceLog.extracted_schema_content,
-            func.length(InvoiceLog.file_content).label("file_size")
+            schema_column,
+            InvoiceLog.file_size
         )
         .order_by(InvoiceLog.created_at.desc())
     )
@@ -53,24 +76,91 @@ async def get_invoice_logs_metadata(
         if search_type == "id":
             # Only filter by ID if query is a valid integer
             if search_query.isdigit():
-                stmt = stmt.where(InvoiceLog.id == int(search_query))
+                search_id = int(search_query)
+                stmt += lambda s: s.where(InvoiceLog.id == search_id)
             else:
                 # If searching by ID but text is not int, return nothing
-                stmt = stmt.where(InvoiceLog.id == -1) 
+                stmt += lambda s: s.where(InvoiceLog.id == -1)
         else:
             # Default to filename search (case-insensitive)
-            stmt = stmt.where(InvoiceLog.filename.ilike(f"%{search_query}%"))
+            pattern = f"%{search_query}%"
+            stmt += lambda s: s.where(InvoiceLog.filename.ilike(pattern))
 
     # Apply Pagination
-    stmt = stmt.offset(skip).limit(limit)
+    stmt += lambda s: s.offset(skip).limit(limit)
     
     result = await db.execute(stmt)
     return result.all()
 
-async def get_invoice_log_by_id(db: AsyncSession, log_id: int) -> Optional[InvoiceLog]:
+async def get_invoice_log_by_id(
+    db: AsyncSession, 
+    log_id: int, 
+    include_content: bool = False
+) -> Optional[InvoiceLog]:
     """
-    Fetches a single invoice log by ID.
+    Fetches a single invoice log by ID. The deferred file blob is only
+    loaded when include_content is set.
     """
-    stmt = select(InvoiceLog).where(InvoiceLog.id == log_id)
+    stmt = lambda_stmt(lambda: select(InvoiceLog).where(InvoiceLog.id == log_id))
+    if include_content:
+        stmt += lambda s: s.options(undefer(InvoiceLog.file_content))
     result = await db.execute(stmt)
-    return result.scalars().first()
\ No newline at end of file
+    return result.scalars().first()
+
+def _sniff_image_type(header: bytes) -> Optional[str]:
+    """
+    Identifies JPEG, PNG, GIF and WebP files from their magic numbers.
+    """
+    if header.startswith(b"\xff\xd8\xff"):
+        return "image/jpeg"
+    if header.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "image/png"
+    if header.startswith((b"GIF87a", b"GIF89a")):
+        return "image/gif"
+    if header[:4] == b"RIFF" and header[8:12] == b"WEBP":
+        return "image/webp"
+    return None
+
+async def get_invoice_log_mime(db: AsyncSession, log_id: int) -> Optional[Tuple[str, Optional[str]]]:
+    """
+    Fetches the filename of a log and the content type sniffed from the first
+    bytes of the stored file, without loading the whole blob. The content type
+    is None for anything other than JPEG, PNG, GIF or WebP.
+    """
+    stmt = (
+        select(
+            InvoiceLog.filename,
+            func.substring(InvoiceLog.file_content, 1, 16, type_=LargeBinary)
+        )
+        .where(InvoiceLog.id == log_id)
+    )
+    result = await db.execute(stmt)
+    row = result.first()
+    if row is None:
+        return None
+    filename, header = row
+    return filename, _sniff_image_type(header or b"")
+
+async def stream_invoice_log_content(
+    db: AsyncSession, 
+    log_id: int, 
+    chunk_size: int = 1 << 20
+) -> AsyncIterator[bytes]:
+    """
+    Yields the stored file blob in chunks, reading one slice per query
+    so the full blob is never held in memory at once.
+    """
+    offset = 1  # Postgres substring() is 1-indexed
+    while True:
+        stmt = (
+            select(func.substring(InvoiceLog.file_content, offset, chunk_size, type_=LargeBinary))
+            .where(InvoiceLog.id == log_id)
+        )
+        result = await db.execute(stmt)
+        chunk = result.scalar_one_or_none()
+        if not chunk:
+            break
+        yield chunk
+        if len(chunk) < chunk_size:
+            break
+        offset += chunk_size
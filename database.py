@@ -1,10 +1,25 @@
 # File: database.py
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+from sqlalchemy import text, make_url
 from sqlalchemy.orm import sessionmaker, declarative_base
 from config import settings
 
 # --- PostgreSQL Setup (SQLAlchemy) ---
-engine = create_async_engine(settings.DATABASE_URL, echo=False)
+# asyncpg's statement cache is a connect argument, while the dialect's
+# prepared statement cache is configured through the URL query string
+DATABASE_URL = make_url(settings.DATABASE_URL).update_query_dict(
+    {"prepared_statement_cache_size": "1024"}
+)
+
+engine = create_async_engine(
+    DATABASE_URL,
+    echo=False,
+    pool_size=20,
+    max_overflow=40,
+    pool_recycle=1800,
+    pool_pre_ping=True,
+    connect_args={"statement_cache_size": 1024}
+)
 
 AsyncSessionLocal = sessionmaker(
     bind=engine,
@@ -19,8 +34,44 @@ async def get_db():
     async with AsyncSessionLocal() as session:
         yield session
 
+def _create_missing_indexes(sync_conn):
+    """create_all skips indexes on tables that already exist, so add them here."""
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(sync_conn, checkfirst=True)
+
+async def _upgrade_invoice_logs(conn):
+    """
+    Upgrades invoice_logs tables created before file_size was stored on the row.
+    Each step is checked first, so the table is only locked when a change is needed.
+    """
+    has_file_size = (await conn.execute(text(
+        "SELECT 1 FROM information_schema.columns "
+        "WHERE table_schema = current_schema() "
+        "AND table_name = 'invoice_logs' AND column_name = 'file_size'"
+    ))).scalar() is not None
+    if not has_file_size:
+        # IF NOT EXISTS: another worker may add the column between the check and here
+        await conn.execute(text("ALTER TABLE invoice_logs ADD COLUMN IF NOT EXISTS file_size INTEGER"))
+        await conn.execute(text("UPDATE invoice_logs SET file_size = length(file_content) WHERE file_size IS NULL"))
+        # Match the NOT NULL constraint fresh tables get from the model
+        await conn.execute(text("ALTER TABLE invoice_logs ALTER COLUMN file_size SET NOT NULL"))
+
+    # PDFs/images are already compressed; EXTERNAL skips TOAST compression
+    # and lets substring() reads fetch only the chunks they need
+    storage = (await conn.execute(text(
+        "SELECT attstorage::text FROM pg_attribute "
+        "WHERE attrelid = 'invoice_logs'::regclass AND attname = 'file_content'"
+    ))).scalar()
+    if storage != "e":
+        await conn.execute(text("ALTER TABLE invoice_logs ALTER COLUMN file_content SET STORAGE EXTERNAL"))
+
 async def init_db():
     """Initializes the database tables."""
     async with engine.begin() as conn:
+        # Required by the trigram index on invoice_logs.filename
+        await conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
         # await conn.run_sync(Base.metadata.drop_all) # Uncomment to reset DB
-        await conn.run_sync(Base.metadata.create_all)
\ No newline at end of file
+        await conn.run_sync(Base.metadata.create_all)
+        await conn.run_sync(_create_missing_indexes)
+        await _upgrade_invoice_logs(conn)
\ No newline at end of file
@@ -3,6 +3,7 @@ import asyncio
 import os
 import sys
 from sqlalchemy.future import select
+from sqlalchemy.orm import undefer
 from database import AsyncSessionLocal
 from models import InvoiceLog
 
@@ -24,7 +25,11 @@ async def extract_single_file(log_id: int):
     
     async with AsyncSessionLocal() as session:
         # Fetch specific log
-        stmt = select(InvoiceLog).where(InvoiceLog.id == log_id)
+        stmt = (
+            select(InvoiceLog)
+            .options(undefer(InvoiceLog.file_content))
+            .where(InvoiceLog.id == log_id)
+        )
         result = await session.execute(stmt)
         log = result.scalars().first()
         
@@ -38,9 +43,16 @@ async def extract_single_file(log_id: int):
             safe_filename = f"{log.id}_{log.filename}"
             file_path = os.path.join(OUTPUT_DIR, safe_filename)
             
-            # Write binary data to file
-            with open(file_path, "wb") as f:
-                f.write(log.file_content)
+            # Write binary data to file with unbuffered writes straight from
+            # a memoryview, so the blob is never copied into a Python buffer
+            view = memoryview(log.file_content)
+            fd = os.open(file_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+            try:
+                while view:
+                    written = os.write(fd, view)
+                    view = view[written:]
+            finally:
+                os.close(fd)
             
             print(f"✅ Successfully saved file to: {file_path}")
             print(f"📄 Original Filename: {log.filename}")
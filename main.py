@@ -1,17 +1,19 @@
 # File: main.py
+import asyncio
 import os
 from fastapi import FastAPI, UploadFile, File, HTTPException, Depends, Query
-from fastapi.responses import StreamingResponse, HTMLResponse, FileResponse
+from fastapi.responses import StreamingResponse, HTMLResponse, FileResponse, Response
 from fastapi.middleware.cors import CORSMiddleware
 from sqlalchemy.ext.asyncio import AsyncSession
 from typing import Dict, Any, List, Optional
+from pydantic import TypeAdapter
 from io import BytesIO
 from PIL import Image
 
 import service
 import crud
 import database
-from schemas import InvoiceData
+from schemas import InvoiceData, LogRowOut
 
 app = FastAPI(title="Invoice Extraction API (Postgres Single Table)", root_path="/invoice")
 
@@ -26,11 +28,22 @@ app.add_middleware(
 
 app.title = "Invoice Extractor V2 (Single Table)"
 
+# Serializes /api/logs pages in pydantic-core, bypassing jsonable_encoder
+_logs_adapter = TypeAdapter(List[LogRowOut])
+
+# Stored images of these (sniffed) types are streamed to the preview as-is, without re-encoding
+PREVIEW_PASSTHROUGH_TYPES = {"image/jpeg", "image/png", "image/gif", "image/webp"}
+
 # Initialize DB tables on startup
 @app.on_event("startup")
 async def startup_event():
     await database.init_db()
 
+# Release pooled VLLM connections on shutdown
+@app.on_event("shutdown")
+async def shutdown_event():
+    await service.close_client()
+
 # Custom endpoint to serve the HTML file at the root URL (/)
 @app.get("/", include_in_schema=False)
 async def serve_admin_panel():
@@ -60,35 +73,46 @@ async def upload_invoice(
     if not file.filename:
         raise HTTPException(status_code=400, detail="No filename provided")
 
-    content = await file.read()
     content_type = file.content_type
     
     pil_image = None
 
+    # UploadFile is already spooled to disk by Starlette; read from it
+    # directly instead of copying it into a second buffer
+    content = None
     try:
         if "application/pdf" in content_type:
-            images = service.pdf_to_images(content)
+            content = await file.read()
+            images = await service.pdf_to_images(content)
             if not images:
                 raise HTTPException(status_code=400, detail="Empty PDF file")
             pil_image = images[0]
         elif "image" in content_type:
-            pil_image = Image.open(BytesIO(content))
+            pil_image = Image.open(file.file)
         else:
             raise HTTPException(status_code=400, detail="Unsupported file type. Use PDF or Image.")
 
         validated_data: InvoiceData = await service.process_invoice_with_vllm(pil_image)
 
-        log_record = await crud.create_invoice_log(
+        # Dump once and reuse the dict for both storage and the response
+        data_dict = validated_data.model_dump(mode='json')
+
+        # Images are only read into bytes now, for the DB insert
+        if content is None:
+            await file.seek(0)
+            content = await file.read()
+
+        log_id = await crud.create_invoice_log(
             db=db, 
             filename=file.filename, 
             file_bytes=content, 
-            data=validated_data
+            data=data_dict
         )
 
         return {
             "message": "Success",
-            "log_id": log_record.id,
-            "data": validated_data
+            "log_id": log_id,
+            "data": data_dict
         }
 
     except Exception as e:
@@ -101,6 +125,7 @@ async def read_logs(
     limit: int = 10, 
     search: Optional[str] = Query(None, description="Search term"),
     type: Optional[str] = Query("filename", description="Search by 'filename' or 'id'"),
+    include_schema: bool = Query(True, description="Return the full extracted JSON instead of only 'total_amount_due'"),
     db: AsyncSession = Depends(database.get_db)
 ):
     """
@@ -111,27 +136,45 @@ async def read_logs(
         skip=skip, 
         limit=limit, 
         search_query=search, 
-        search_type=type
+        search_type=type,
+        include_schema=include_schema
     )
     
-    return [
-        {
-            "id": row.id,
-            "filename": row.filename,
-            "created_at": row.created_at,
-            "extracted_schema_content": row.extracted_schema_content,
-            "file_size": row.file_size
-        } 
-        for row in logs
-    ]
+    # Rows carry either 'extracted_schema_content' or 'total_amount_due'
+    return Response(
+        content=_logs_adapter.dump_json([row._asdict() for row in logs]),
+        media_type="application/json"
+    )
+
+def _encode_preview_jpeg(image: Image.Image) -> BytesIO:
+    """Re-encodes a PIL image as JPEG into an in-memory buffer."""
+    img_buffer = BytesIO()
+    image = image.convert("RGB")
+    image.save(img_buffer, format="JPEG")
+    img_buffer.seek(0)
+    return img_buffer
+
+async def _stream_log_content(log_id: int):
+    """Streams a stored file from its own session, which outlives the request's."""
+    async with database.AsyncSessionLocal() as session:
+        async for chunk in crud.stream_invoice_log_content(session, log_id):
+            yield chunk
 
 @app.get("/api/logs/{log_id}/preview")
 async def preview_log_image(log_id: int, db: AsyncSession = Depends(database.get_db)):
     """
-    Fetches the raw bytes from DB, converts to an image in memory, 
-    and streams it back.
+    Streams browser-renderable images straight from the DB. Other files
+    (e.g. PDFs) are converted to a JPEG in memory and streamed back.
     """
-    log = await crud.get_invoice_log_by_id(db, log_id)
+    mime = await crud.get_invoice_log_mime(db, log_id)
+    if not mime:
+        raise HTTPException(status_code=404, detail="Log not found")
+
+    _, content_type = mime
+    if content_type in PREVIEW_PASSTHROUGH_TYPES:
+        return StreamingResponse(_stream_log_content(log_id), media_type=content_type)
+
+    log = await crud.get_invoice_log_by_id(db, log_id, include_content=True)
     if not log:
         raise HTTPException(status_code=404, detail="Log not found")
     
@@ -143,7 +186,7 @@ async def preview_log_image(log_id: int, db: AsyncSession = Depends(database.get
             output_image = Image.open(BytesIO(file_bytes))
         except IOError:
             try:
-                images = service.pdf_to_images(file_bytes)
+                images = await service.pdf_to_images(file_bytes)
                 if images:
                     output_image = images[0]
             except Exception:
@@ -152,10 +195,7 @@ async def preview_log_image(log_id: int, db: AsyncSession = Depends(database.get
         if output_image is None:
              raise HTTPException(status_code=400, detail="Could not convert file content to image preview.")
 
-        img_buffer = BytesIO()
-        output_image = output_image.convert("RGB")
-        output_image.save(img_buffer, format="JPEG")
-        img_buffer.seek(0)
+        img_buffer = await asyncio.to_thread(_encode_preview_jpeg, output_image)
         
         return StreamingResponse(img_buffer, media_type="image/jpeg")
 
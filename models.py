@@ -1,6 +1,7 @@
 # File: models.py
-from sqlalchemy import Column, Integer, String, DateTime, LargeBinary
+from sqlalchemy import Column, Integer, String, DateTime, LargeBinary, Index
 from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.orm import deferred
 from sqlalchemy.sql import func
 from database import Base
 
@@ -11,6 +12,18 @@ class InvoiceLog(Base):
 
     id = Column(Integer, primary_key=True, index=True)
     filename = Column(String, nullable=False)
-    file_content = Column(LargeBinary, nullable=False) # Stores the raw PDF/Image bytes
+    # Deferred: ORM queries only load the blob when asked via undefer()
+    file_content = deferred(Column(LargeBinary, nullable=False)) # Stores the raw PDF/Image bytes (out-of-line, uncompressed TOAST)
+    file_size = Column(Integer, nullable=False) # Stored at insert so listings never read the blob
     extracted_schema_content = Column(JSONB, nullable=False) # Stores the extracted JSON
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
\ No newline at end of file
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+# 2. Indexes backing the /api/logs sort (newest first) and filename ILIKE search.
+# The trigram index requires the pg_trgm extension (created in database.init_db).
+Index("ix_invoice_logs_created_at", InvoiceLog.created_at.desc())
+Index(
+    "ix_invoice_logs_filename_trgm",
+    InvoiceLog.filename,
+    postgresql_using="gin",
+    postgresql_ops={"filename": "gin_trgm_ops"}
+)
\ No newline at end of file
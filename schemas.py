@@ -1,6 +1,10 @@
 # File: schemas.py
+import functools
+import orjson
+from datetime import datetime
 from pydantic import BaseModel, Field
-from typing import List, Optional
+from typing import List, Optional, Dict, Any
+from typing_extensions import TypedDict, NotRequired
 
 # --- Pydantic Models for Data Structure ---
 
@@ -41,4 +45,23 @@ class InvoiceData(BaseModel):
     vendor_info: VendorInfo
     customer_info: CustomerInfo
     line_items: List[InvoiceItem]
-    summary: Summary
\ No newline at end of file
+    summary: Summary
+
+    @classmethod
+    @functools.lru_cache(maxsize=1)
+    def cached_json_schema(cls) -> str:
+        """
+        Returns the model's JSON schema as an indented string, built once per class.
+        """
+        return orjson.dumps(cls.model_json_schema(), option=orjson.OPT_INDENT_2).decode()
+
+# --- API Response Models ---
+
+class LogRowOut(TypedDict):
+    """A row of /api/logs; carries either the full schema content or only the total."""
+    id: int
+    filename: str
+    created_at: Optional[datetime]
+    file_size: int
+    extracted_schema_content: NotRequired[Dict[str, Any]]
+    total_amount_due: NotRequired[Optional[str]]
\ No newline at end of file
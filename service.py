@@ -1,39 +1,108 @@
 # File: service.py
+import asyncio
 import base64
 import io
-import json
-from typing import List, Dict, Any
+import orjson
+from typing import List, Dict, Any, Optional
 from PIL import Image
+from pydantic import ValidationError
 from pdf2image import convert_from_bytes
 import httpx
 from config import settings
 from schemas import InvoiceData
 
-def pdf_to_images(file_bytes: bytes) -> List[Image.Image]:
+# Images sent to VLLM are downscaled to fit this box and re-encoded at this quality
+MAX_IMAGE_SIZE = (1600, 1600)
+JPEG_QUALITY = 85
+
+# Shared VLLM client so connections are pooled and reused across requests
+_client: Optional[httpx.AsyncClient] = None
+
+def get_client() -> httpx.AsyncClient:
+    """
+    Returns the module-level VLLM client, creating it on first use.
+    """
+    global _client
+    if _client is None:
+        _client = httpx.AsyncClient(
+            base_url=settings.VLLM_API_URL,
+            timeout=60.0,
+            http2=True,
+            limits=httpx.Limits(max_connections=64, max_keepalive_connections=32)
+        )
+    return _client
+
+async def close_client():
+    """
+    Closes the shared VLLM client, if it was created.
     """
-    Converts a PDF file (bytes) into a list of PIL Images.
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+async def pdf_to_images(file_bytes: bytes) -> List[Image.Image]:
+    """
+    Converts the first page of a PDF file (bytes) into a list of PIL Images,
+    since callers only use the first page.
+    Rasterization runs in a worker thread to keep the event loop free.
     """
     try:
-        images = convert_from_bytes(file_bytes)
+        images = await asyncio.to_thread(
+            convert_from_bytes,
+            file_bytes,
+            dpi=150,
+            fmt="jpeg",
+            first_page=1,
+            last_page=1
+        )
         return images
     except Exception as e:
         raise ValueError(f"Failed to convert PDF to image: {str(e)}")
 
-def encode_image_to_base64(image: Image.Image) -> str:
-    """
-    Encodes a PIL Image to a base64 string.
-    """
+def _encode_image_to_jpeg_sync(image: Image.Image) -> bytes:
     buffered = io.BytesIO()
     image = image.convert("RGB")
-    image.save(buffered, format="JPEG")
-    img_str = base64.b64encode(buffered.getvalue()).decode("utf-8")
-    return img_str
+    image.thumbnail(MAX_IMAGE_SIZE, Image.Resampling.LANCZOS)
+    image.save(buffered, format="JPEG", quality=JPEG_QUALITY, optimize=True, progressive=False)
+    return buffered.getvalue()
+
+async def encode_image_to_jpeg(image: Image.Image) -> bytes:
+    """
+    Downscales and encodes a PIL Image to raw JPEG bytes in a worker thread.
+    """
+    return await asyncio.to_thread(_encode_image_to_jpeg_sync, image)
+
+def strip_markdown_fences(content: str) -> str:
+    """
+    Returns the body of the first ```json ... ``` (or bare ```) block with a single
+    slice, drops a lone trailing fence, or returns the content unchanged.
+    """
+    stripped = content.lstrip()
+    if stripped.startswith("```"):
+        start = len(content) - len(stripped) + 3
+        if content.startswith("json", start):
+            start += 4
+
+        end = content.find("```", start)
+        if end == -1:
+            end = len(content)
+
+        # Surrounding whitespace is tolerated by the JSON parser, so no strip() copy
+        return content[start:end]
+
+    if content.rstrip().endswith("```"):
+        return content[:content.rfind("```")]
+
+    return content
 
 async def process_invoice_with_vllm(image: Image.Image) -> InvoiceData:
     """
     Sends the image to VLLM and validates the response using Pydantic.
     """
-    base64_image = encode_image_to_base64(image)
+    jpeg_bytes = await encode_image_to_jpeg(image)
+    # Base64 output is pure ASCII, so decode it once straight into the data URL
+    image_url = "data:image/jpeg;base64," + base64.b64encode(jpeg_bytes).decode("ascii")
     
     # Get the dynamic prompt with Pydantic schema
     system_prompt = settings.get_system_prompt()
@@ -51,7 +120,7 @@ async def process_invoice_with_vllm(image: Image.Image) -> InvoiceData:
                     {
                         "type": "image_url",
                         "image_url": {
-                            "url": f"data:image/jpeg;base64,{base64_image}"
+                            "url": image_url
                         }
                     }
                 ]
@@ -61,35 +130,30 @@ async def process_invoice_with_vllm(image: Image.Image) -> InvoiceData:
         "temperature": 0.1 
     }
 
-    async with httpx.AsyncClient(timeout=60.0) as client:
+    client = get_client()
+    try:
+        response = await client.post(
+            "/chat/completions",
+            content=orjson.dumps(payload),
+            headers={"Content-Type": "application/json"}
+        )
+        response.raise_for_status()
+        result = orjson.loads(response.content)
+        
+        content = result["choices"][0]["message"]["content"]
+        
+        # Cleanup Markdown code blocks if present
+        content = strip_markdown_fences(content)
+        
+        # Parse and validate with Pydantic in a single pass
         try:
-            response = await client.post(
-                f"{settings.VLLM_API_URL}/chat/completions",
-                json=payload
-            )
-            response.raise_for_status()
-            result = response.json()
-            
-            content = result["choices"][0]["message"]["content"]
-            
-            # Cleanup Markdown code blocks if present
-            if "```json" in content:
-                content = content.split("```json")[1].split("```")[0].strip()
-            elif "```" in content:
-                content = content.replace("```", "").strip()
-            
-            # 1. Parse JSON
-            try:
-                raw_json = json.loads(content)
-            except json.JSONDecodeError:
-                raise ValueError(f"Model did not return valid JSON: {content}")
-
-            # 2. Validate with Pydantic
-            validated_data = InvoiceData.model_validate(raw_json)
-            
-            return validated_data
-            
-        except httpx.RequestError as e:
-            raise RuntimeError(f"API Request failed: {str(e)}")
-        except Exception as e:
-            raise RuntimeError(f"Processing error: {str(e)}")
\ No newline at end of file
+            validated_data = InvoiceData.model_validate_json(content)
+        except ValidationError as e:
+            raise ValueError(f"Model did not return valid JSON: {content}\n{e}") from e
+        
+        return validated_data
+        
+    except httpx.RequestError as e:
+        raise RuntimeError(f"API Request failed: {str(e)}")
+    except Exception as e:
+        raise RuntimeError(f"Processing error: {str(e)}")
\ No newline at end of file